@@ -1,5 +1,12 @@
 # Adafruit NeoPixel library port to the rpi_ws281x library.
 # Author: Tony DiCola (tony@tonydicola.com), Jeremy Garff (jer@jers.net)
+import atexit
+import numbers
+import operator
+import sys
+import threading
+import weakref
+
 import _rpi_ws281x as ws
 
 
@@ -11,43 +18,104 @@ def Color(red, green, blue):
 	return (red << 16) | (green << 8) | blue
 
 
+class _Cleanup(object):
+	"""Clean up memory used by the library when not needed anymore.  Holds no
+	reference to the strip itself, so it can run once the strip is collected,
+	and does nothing when called again.  Takes the strip's lock, so it can't
+	free the buffers while another thread (e.g. a daemon thread still running at
+	interpreter exit) is rendering.
+	"""
+	__slots__ = ('leds', 'lock', 'initialized')
+
+	def __init__(self, leds, lock):
+		self.leds = leds
+		self.lock = lock
+		self.initialized = False
+
+	def __call__(self):
+		with self.lock:
+			if self.leds is not None:
+				# ws2811_fini is only safe after a successful ws2811_init.
+				if self.initialized:
+					ws.ws2811_fini(self.leds)
+				ws.delete_ws2811_t(self.leds)
+				self.leds = None
+				self.initialized = False
+				# Note that ws2811_fini will free the memory used by led_data internally.
+
+
+# NumPy type string of unsigned 32-bit integers in native byte order.
+_UINT32_TYPESTR = '<u4' if sys.byteorder == 'little' else '>u4'
+
+
+def _is_uint32_array(value):
+	"""Return True if value is a one-dimensional, C-contiguous array of unsigned
+	32-bit integers in native byte order, whose data can be copied in directly.
+	"""
+	interface = getattr(value, '__array_interface__', None)
+	return (interface is not None and
+	        interface['typestr'] == _UINT32_TYPESTR and
+	        len(interface['shape']) == 1 and
+	        interface.get('strides') is None)
+
+
 class _LED_Data(object):
 	"""Wrapper class which makes a SWIG LED color data array look and feel like
 	a Python list of integers.
 	"""
+	__slots__ = ('size', 'channel', '_led_get', '_led_set')
+
 	def __init__(self, channel, size):
 		self.size = size
 		self.channel = channel
+		# Bind the library accessors once to skip the module lookup per access.
+		self._led_get = ws.ws2811_led_get
+		self._led_set = ws.ws2811_led_set
 
 	def __getitem__(self, pos):
 		"""Return the 24-bit RGB color value at the provided position or slice
 		of positions.
 		"""
 		# Handle if a slice of positions are passed in by grabbing all the values
-		# and returning them in a list.
+		# and returning them in a list, built by a single call into the library.
 		if isinstance(pos, slice):
-			return [ws.ws2811_led_get(self.channel, n) for n in range(pos.indices(self.size))]
+			start, stop, step = pos.indices(self.size)
+			return ws.ws2811_leds_copy_out(self.channel, start, stop, step)
 		# Else assume the passed in value is a number to the position.
 		else:
-			return ws.ws2811_led_get(self.channel, pos)
+			return self._led_get(self.channel, pos)
 
 	def __setitem__(self, pos, value):
 		"""Set the 24-bit RGB color value at the provided position or slice of
-		positions.
+		positions.  A slice can also be set from a NumPy array; if it is
+		one-dimensional, C-contiguous and has dtype=numpy.uint32 its data is
+		copied in directly.  NumPy integer scalars are treated like a single color.
 		"""
 		# Handle if a slice of positions are passed in by setting the appropriate
-		# LED data values to the provided values.
+		# LED data values to the provided values (or a single color for all of
+		# them) with one call into the library.
 		if isinstance(pos, slice):
-			index = 0
-			for n in range(pos.indices(self.size)):
-				ws.ws2811_led_set(self.channel, n, value[index])
-				index += 1
+			start, stop, step = pos.indices(self.size)
+			# NumPy scalars and 0-d arrays are a single color too.
+			if isinstance(value, numbers.Integral) or getattr(value, 'ndim', None) == 0:
+				value = operator.index(value)
+				if step == 1:
+					ws.ws2811_leds_fill(self.channel, start, stop, value)
+				else:
+					ws.ws2811_led_set_bulk(self.channel, start, stop, step, value)
+			elif step == 1 and _is_uint32_array(value):
+				ws.ws2811_leds_from_buffer(self.channel, start, stop, value)
+			else:
+				ws.ws2811_led_set_bulk(self.channel, start, stop, step, value)
 		# Else assume the passed in value is a number to the position.
 		else:
-			return ws.ws2811_led_set(self.channel, pos, value)
+			return self._led_set(self.channel, pos, value)
 
 
 class Adafruit_NeoPixel(object):
+	__slots__ = ('_leds', '_channel', '_led_data', '_render', '_lock', '_cleanup',
+	             '__weakref__')
+
 	def __init__(self, num, pin, freq_hz=800000, dma=5, invert=False, brightness=255, channel=0):
 		"""Class to represent a NeoPixel/WS281x LED display.  Num should be the
 		number of pixels in the display, and pin should be the GPIO pin connected
@@ -57,17 +125,10 @@ class Adafruit_NeoPixel(object):
 		specifying if the signal line should be inverted (default False), and
 		channel, the PWM channel to use (defaults to 0).
 		"""
-		# Create ws2811_t structure and fill in parameters.
+		# Create ws2811_t structure and fill in parameters.  SWIG allocates it
+		# zeroed, so the unused channel is already disabled.
 		self._leds = ws.new_ws2811_t()
 
-		# Initialize the channels to zero
-		for channum in range(2):
-			chan = ws.ws2811_channel_get(self._leds, channum)
-			ws.ws2811_channel_t_count_set(chan, 0)
-			ws.ws2811_channel_t_gpionum_set(chan, 0)
-			ws.ws2811_channel_t_invert_set(chan, 0)
-			ws.ws2811_channel_t_brightness_set(chan, 0)
-
 		# Initialize the channel in use
 		self._channel = ws.ws2811_channel_get(self._leds, channel)
 		ws.ws2811_channel_t_count_set(self._channel, num)
@@ -81,30 +142,70 @@ class Adafruit_NeoPixel(object):
 
 		# Grab the led data array.
 		self._led_data = _LED_Data(self._channel, num)
+		self._render = ws.ws2811_render
+		# The library releases the GIL while rendering and waiting, so calls from
+		# different threads (and cleanup) have to be serialized here.
+		self._lock = threading.Lock()
 
-	def __del__(self):
-		# Clean up memory used by the library when not needed anymore.
-		if self._leds is not None:
-			ws.ws2811_fini(self._leds)
-			ws.delete_ws2811_t(self._leds)
-			self._leds = None
-			self._channel = None
-			# Note that ws2811_fini will free the memory used by led_data internally.
+		# Clean up once this object is garbage collected, or at interpreter exit.
+		self._cleanup = _Cleanup(self._leds, self._lock)
+		if hasattr(weakref, 'finalize'):
+			weakref.finalize(self, self._cleanup)
+		else:
+			# Python 2 has no weakref.finalize, __del__ covers collection instead.
+			atexit.register(self._cleanup)
+
+	if not hasattr(weakref, 'finalize'):
+		def __del__(self):
+			self._cleanup()
 
 	def begin(self):
 		"""Initialize library, must be called once before other functions are
-		called.
+		called.  All LED and DMA buffers are allocated here and reused by every
+		call to show().
 		"""
 		resp = ws.ws2811_init(self._leds)
+		# Only shut the library down on cleanup if it is initialized, a failed
+		# ws2811_init has already released everything it allocated.
+		self._cleanup.initialized = resp == 0
 		if resp != 0:
 			raise RuntimeError('ws2811_init failed with code {0}'.format(resp))
 		
 	def show(self):
-		"""Update the display with the data from the LED buffer."""
-		resp = ws.ws2811_render(self._leds)
+		"""Update the display with the data from the LED buffer.  Returns as soon
+		as the data starts streaming out, so the next frame can be prepared while
+		the display updates.  Use wait() to block until the update is complete.
+		Safe to call from multiple threads, other threads keep running while the
+		previous update finishes.
+		"""
+		with self._lock:
+			self._check_initialized()
+			resp = self._render(self._leds)
 		if resp != 0:
 			raise RuntimeError('ws2811_render failed with code {0}'.format(resp))
 
+	def wait(self):
+		"""Wait for the display update started by show() to complete."""
+		with self._lock:
+			self._check_initialized()
+			resp = ws.ws2811_wait(self._leds)
+		if resp != 0:
+			raise RuntimeError('ws2811_wait failed with code {0}'.format(resp))
+
+	def isBusy(self):
+		"""Return True if the display update started by show() is still running.
+		Blocks while another thread is inside show() or wait().
+		"""
+		with self._lock:
+			self._check_initialized()
+			return ws.ws2811_busy(self._leds) != 0
+
+	def _check_initialized(self):
+		# The hardware is only mapped between a successful begin() and cleanup.
+		# Must be called with the lock held.
+		if not self._cleanup.initialized:
+			raise RuntimeError('LED strip is not initialized, call begin() first')
+
 	def setPixelColor(self, n, color):
 		"""Set LED at position n to the provided 24-bit color value (in RGB order).
 		"""
@@ -115,7 +216,22 @@ class Adafruit_NeoPixel(object):
 		Each color component should be a value from 0 to 255 (where 0 is the
 		lowest intensity and 255 is the highest intensity).
 		"""
-		self.setPixelColor(n, Color(red, green, blue))
+		ws.ws2811_led_set_rgb(self._channel, n, red, green, blue)
+
+	def setPixelsRGB(self, pixels):
+		"""Set LEDs starting at position 0 from a buffer of red, green, blue bytes,
+		such as a C-contiguous NumPy array with shape (N, 3) and dtype=numpy.uint8
+		(or any shape whose last dimension is 3, e.g. an image).  N may not be more
+		than the number of pixels in the display.
+		"""
+		ws.ws2811_leds_from_rgb_buffer(self._channel, pixels)
+
+	def fill(self, color, start=0, end=None):
+		"""Set all LEDs from position start up to (but not including) end to the
+		provided 24-bit color value.  By default the whole display is filled.
+		"""
+		start, end, _ = slice(start, end).indices(self._led_data.size)
+		ws.ws2811_leds_fill(self._channel, start, end, color)
 
 	def setBrightness(self, brightness):
 		"""Scale each LED in the buffer by the provided brightness.  A brightness
@@ -129,6 +245,15 @@ class Adafruit_NeoPixel(object):
 		"""
 		return self._led_data
 
+	def getPixelBuffer(self):
+		"""Return a writable memoryview of 32-bit colors which aliases the LED
+		display data, so it can be modified without any copies (for example with
+		numpy.asarray(strip.getPixelBuffer())).  Only valid after begin() has been
+		called.  The view keeps this object alive, so the LED data is not freed
+		while it is in use.
+		"""
+		return ws.ws2811_channel_leds_buffer(self._channel, self)
+
 	def numPixels(self):
 		"""Return the number of pixels in the display."""
 		return ws.ws2811_channel_t_count_get(self._channel)
@@ -13,15 +13,191 @@
 // Declare functions which will be exported as anything in the ws2811.h header.
 %{
 #include "../ws2811.h"
+
+// Number of LEDs addressed by an already normalized (see slice.indices) slice.
+static Py_ssize_t ws2811_slice_len(int start, int stop, int step)
+{
+    if (step > 0 && start < stop)
+    {
+        return (stop - start + step - 1) / step;
+    }
+
+    if (step < 0 && start > stop)
+    {
+        return (start - stop - step - 1) / -step;
+    }
+
+    return 0;
+}
+
+// Convert a Python integer to a color, rejecting values that don't fit in 32 bits just
+// like the uint32_t argument conversion does.
+static int ws2811_color_from_object(PyObject *obj, uint32_t *color)
+{
+    PyObject *index = PyNumber_Index(obj);
+    unsigned long value;
+
+    if (!index)
+    {
+        return -1;
+    }
+
+    value = PyLong_AsUnsignedLong(index);
+    Py_DECREF(index);
+    if (value == (unsigned long)-1 && PyErr_Occurred())
+    {
+        return -1;
+    }
+
+    if (value > 0xffffffffUL)
+    {
+        PyErr_SetString(PyExc_OverflowError, "color out of range for uint32_t");
+        return -1;
+    }
+
+    *color = value;
+
+    return 0;
+}
+
+// Check if a buffer format string describes native unsigned 32-bit items.
+static int ws2811_is_uint32_format(const char *format)
+{
+    if (!format)
+    {
+        return 0;
+    }
+
+    if (*format == '@' || *format == '=' || *format == '<')
+    {
+        format++;
+    }
+
+    return !strcmp(format, "I") || !strcmp(format, "L");
+}
+
+// Check if a buffer format string describes unsigned 8-bit items.
+static int ws2811_is_uint8_format(const char *format)
+{
+    if (!format)
+    {
+        return 1;                                  // No format means unsigned bytes
+    }
+
+    if (*format && strchr("@=<>!", *format))
+    {
+        format++;
+    }
+
+    return !strcmp(format, "B");
+}
+
+// Buffer exporter for a channel's LED array.  It holds a reference to the object owning
+// the ws2811_t, so the array can't be freed while any view of it is still alive.
+typedef struct
+{
+    PyObject_HEAD
+    PyObject *owner;
+    ws2811_channel_t *channel;
+    Py_ssize_t count;
+} ws2811_leds_buffer_t;
+
+static int ws2811_leds_buffer_getbuffer(PyObject *self, Py_buffer *view, int flags)
+{
+    ws2811_leds_buffer_t *buffer = (ws2811_leds_buffer_t *)self;
+
+    if (!buffer->channel->leds)
+    {
+        PyErr_SetString(PyExc_BufferError, "LED buffer is not allocated");
+        return -1;
+    }
+
+    if (PyBuffer_FillInfo(view, self, buffer->channel->leds,
+                          buffer->count * sizeof(ws2811_led_t), 0, flags) < 0)
+    {
+        return -1;
+    }
+
+    view->itemsize = sizeof(ws2811_led_t);
+    if (flags & PyBUF_FORMAT)
+    {
+        view->format = "I";
+    }
+    if (flags & PyBUF_ND)
+    {
+        view->shape = &buffer->count;
+    }
+
+    return 0;
+}
+
+static int ws2811_leds_buffer_traverse(PyObject *self, visitproc visit, void *arg)
+{
+    Py_VISIT(((ws2811_leds_buffer_t *)self)->owner);
+    return 0;
+}
+
+static int ws2811_leds_buffer_clear(PyObject *self)
+{
+    Py_CLEAR(((ws2811_leds_buffer_t *)self)->owner);
+    return 0;
+}
+
+static void ws2811_leds_buffer_dealloc(PyObject *self)
+{
+    PyObject_GC_UnTrack(self);
+    ws2811_leds_buffer_clear(self);
+    PyObject_GC_Del(self);
+}
+
+static PyBufferProcs ws2811_leds_buffer_procs =
+{
+    .bf_getbuffer = ws2811_leds_buffer_getbuffer,
+};
+
+static PyTypeObject ws2811_leds_buffer_type =
+{
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_rpi_ws281x.leds_buffer",
+    .tp_basicsize = sizeof(ws2811_leds_buffer_t),
+    .tp_dealloc = ws2811_leds_buffer_dealloc,
+    .tp_as_buffer = &ws2811_leds_buffer_procs,
+#if PY_MAJOR_VERSION < 3
+    // Python 2 only uses bf_getbuffer if the type says it implements it
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC | Py_TPFLAGS_HAVE_NEWBUFFER,
+#else
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,
+#endif
+    .tp_traverse = ws2811_leds_buffer_traverse,
+    .tp_clear = ws2811_leds_buffer_clear,
+};
 %}
 
+// Release the GIL while rendering or waiting on the DMA, so other Python
+// threads can run during the transfer.  This means the GIL no longer keeps
+// calls for the same ws2811_t apart, callers using them from several threads
+// must serialize them (Adafruit_NeoPixel uses a lock for this).
+%exception ws2811_render
+{
+    Py_BEGIN_ALLOW_THREADS
+    $action
+    Py_END_ALLOW_THREADS
+}
+
+%exception ws2811_wait
+{
+    Py_BEGIN_ALLOW_THREADS
+    $action
+    Py_END_ALLOW_THREADS
+}
+
 // Process ws2811.h header and export all included functions.
 %include "../ws2811.h"
 
 %inline %{
     uint32_t ws2811_led_get(ws2811_channel_t *channel, int lednum)
     {
-        if (lednum >= channel->count)
+        if (lednum < 0 || lednum >= channel->count)
         {
             return -1;
         }
@@ -31,7 +207,7 @@
 
     int ws2811_led_set(ws2811_channel_t *channel, int lednum, uint32_t color)
     {
-        if (lednum >= channel->count)
+        if (lednum < 0 || lednum >= channel->count)
         {
             return -1;
         }
@@ -41,6 +217,249 @@
         return 0;
     }
 
+    int ws2811_led_set_rgb(ws2811_channel_t *channel, int lednum, uint8_t red, uint8_t green,
+                           uint8_t blue)
+    {
+        if (lednum < 0 || lednum >= channel->count)
+        {
+            return -1;
+        }
+
+        channel->leds[lednum] = ((uint32_t)red << 16) | ((uint32_t)green << 8) | blue;
+
+        return 0;
+    }
+
+    int ws2811_leds_fill(ws2811_channel_t *channel, int start, int stop, uint32_t color)
+    {
+        ws2811_led_t *leds = channel->leds;
+        int i;
+
+        if (start < 0 || stop > channel->count)
+        {
+            return -1;
+        }
+
+        for (i = start; i < stop; i++)
+        {
+            leds[i] = color;
+        }
+
+        return 0;
+    }
+
+    PyObject *ws2811_led_set_bulk(ws2811_channel_t *channel, int start, int stop, int step,
+                                  PyObject *colors)
+    {
+        Py_ssize_t i, n = ws2811_slice_len(start, stop, step);
+        PyObject *seq;
+        int lednum;
+
+        if (n && (start < 0 || start >= channel->count ||
+                  start + (n - 1) * step < 0 || start + (n - 1) * step >= channel->count))
+        {
+            PyErr_SetString(PyExc_IndexError, "LED index out of range");
+            return NULL;
+        }
+
+        // A single color is written to every LED in the slice.  NumPy arrays also
+        // implement __index__, so only treat non-sequences as a single color.
+        if (PyIndex_Check(colors) && !PySequence_Check(colors))
+        {
+            uint32_t color;
+
+            if (ws2811_color_from_object(colors, &color) < 0)
+            {
+                return NULL;
+            }
+
+            for (i = 0, lednum = start; i < n; i++, lednum += step)
+            {
+                channel->leds[lednum] = color;
+            }
+
+            Py_RETURN_NONE;
+        }
+
+        seq = PySequence_Fast(colors, "colors must be an integer or a sequence of integers");
+        if (!seq)
+        {
+            return NULL;
+        }
+
+        if (PySequence_Fast_GET_SIZE(seq) != n)
+        {
+            PyErr_Format(PyExc_ValueError, "expected %zd colors, got %zd", n,
+                         PySequence_Fast_GET_SIZE(seq));
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        for (i = 0, lednum = start; i < n; i++, lednum += step)
+        {
+            uint32_t color;
+
+            if (ws2811_color_from_object(PySequence_Fast_GET_ITEM(seq, i), &color) < 0)
+            {
+                Py_DECREF(seq);
+                return NULL;
+            }
+
+            channel->leds[lednum] = color;
+        }
+
+        Py_DECREF(seq);
+        Py_RETURN_NONE;
+    }
+
+    PyObject *ws2811_leds_from_buffer(ws2811_channel_t *channel, int start, int stop,
+                                      PyObject *buffer)
+    {
+        Py_buffer view;
+        int n = stop > start ? stop - start : 0;
+
+        if (PyObject_GetBuffer(buffer, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+        {
+            return NULL;
+        }
+
+        if (view.itemsize != sizeof(ws2811_led_t) || !ws2811_is_uint32_format(view.format))
+        {
+            PyErr_SetString(PyExc_TypeError, "buffer items must be unsigned 32-bit colors");
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+
+        if (view.ndim != 1)
+        {
+            PyErr_SetString(PyExc_TypeError, "buffer must be one-dimensional");
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+
+        if (start < 0 || stop > channel->count ||
+            view.len != (Py_ssize_t)(n * sizeof(ws2811_led_t)))
+        {
+            PyErr_Format(PyExc_ValueError, "expected %d colors, got %zd", n,
+                         view.len / view.itemsize);
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+
+        memcpy(&channel->leds[start], view.buf, view.len);
+
+        PyBuffer_Release(&view);
+        Py_RETURN_NONE;
+    }
+
+    PyObject *ws2811_leds_from_rgb_buffer(ws2811_channel_t *channel, PyObject *buffer)
+    {
+        Py_buffer view;
+        const uint8_t *rgb;
+        Py_ssize_t i, n;
+
+        if (PyObject_GetBuffer(buffer, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+        {
+            return NULL;
+        }
+
+        // Multi-dimensional buffers must hold one color per row, e.g. shape (N, 3).
+        if (view.itemsize != 1 || !ws2811_is_uint8_format(view.format) || view.len % 3 ||
+            (view.ndim > 1 && view.shape[view.ndim - 1] != 3))
+        {
+            PyErr_SetString(PyExc_TypeError, "buffer must hold unsigned 8-bit red, green, blue triplets");
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+
+        n = view.len / 3;
+        if (n > channel->count)
+        {
+            PyErr_Format(PyExc_ValueError, "expected at most %d colors, got %zd",
+                         channel->count, n);
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+
+        rgb = view.buf;
+        for (i = 0; i < n; i++, rgb += 3)
+        {
+            channel->leds[i] = ((uint32_t)rgb[0] << 16) | ((uint32_t)rgb[1] << 8) | rgb[2];
+        }
+
+        PyBuffer_Release(&view);
+        Py_RETURN_NONE;
+    }
+
+    PyObject *ws2811_leds_copy_out(ws2811_channel_t *channel, int start, int stop, int step)
+    {
+        Py_ssize_t i, n = ws2811_slice_len(start, stop, step);
+        PyObject *colors;
+        int lednum;
+
+        if (n && (start < 0 || start >= channel->count ||
+                  start + (n - 1) * step < 0 || start + (n - 1) * step >= channel->count))
+        {
+            PyErr_SetString(PyExc_IndexError, "LED index out of range");
+            return NULL;
+        }
+
+        colors = PyList_New(n);
+        if (!colors)
+        {
+            return NULL;
+        }
+
+        for (i = 0, lednum = start; i < n; i++, lednum += step)
+        {
+            PyObject *color = PyLong_FromUnsignedLong(channel->leds[lednum]);
+
+            if (!color)
+            {
+                Py_DECREF(colors);
+                return NULL;
+            }
+
+            PyList_SET_ITEM(colors, i, color);
+        }
+
+        return colors;
+    }
+
+    PyObject *ws2811_channel_leds_buffer(ws2811_channel_t *channel, PyObject *owner)
+    {
+        ws2811_leds_buffer_t *buffer;
+        PyObject *colors;
+
+        if (!channel->leds)
+        {
+            PyErr_SetString(PyExc_RuntimeError, "LED buffer not allocated, call ws2811_init first");
+            return NULL;
+        }
+
+        if (PyType_Ready(&ws2811_leds_buffer_type) < 0)
+        {
+            return NULL;
+        }
+
+        buffer = PyObject_GC_New(ws2811_leds_buffer_t, &ws2811_leds_buffer_type);
+        if (!buffer)
+        {
+            return NULL;
+        }
+
+        Py_INCREF(owner);
+        buffer->owner = owner;
+        buffer->channel = channel;
+        buffer->count = channel->count;
+        PyObject_GC_Track((PyObject *)buffer);
+
+        colors = PyMemoryView_FromObject((PyObject *)buffer);
+        Py_DECREF(buffer);
+
+        return colors;
+    }
+
     ws2811_channel_t *ws2811_channel_get(ws2811_t *ws, int channelnum)
     {
         return &ws->channel[channelnum];
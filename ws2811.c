@@ -67,6 +67,7 @@
 typedef struct ws2811_device
 {
     volatile uint8_t *pwm_raw;
+    uint8_t *pwm_render;
     volatile dma_t *dma;
     volatile pwm_t *pwm;
     volatile dma_cb_t *dma_cb;
@@ -75,6 +76,9 @@ typedef struct ws2811_device
     volatile gpio_t *gpio;
     volatile cm_pwm_t *cm_pwm;
     int max_count;
+    int lut_brightness[RPI_PWM_CHANNELS];
+    int lut_invert[RPI_PWM_CHANNELS];
+    uint32_t symbol_lut[RPI_PWM_CHANNELS][256];
 } ws2811_device_t;
 
 
@@ -104,6 +108,55 @@ static int max_channel_led_count(ws2811_t *ws2811)
     return max;
 }
 
+/**
+ * Return the symbol lookup table for a channel, rebuilding it only if the channel
+ * brightness or inversion changed since it was last built.  Each entry holds the 24
+ * PWM symbol bits (most significant first) for a color component value after
+ * brightness scaling and inversion.
+ *
+ * @param    ws2811  ws2811 instance pointer.
+ * @param    chan    Channel number.
+ *
+ * @returns  Table mapping each color component value to its PWM symbol bits.
+ */
+static const uint32_t *channel_symbol_lut(ws2811_t *ws2811, int chan)
+{
+    ws2811_device_t *device = ws2811->device;
+    ws2811_channel_t *channel = &ws2811->channel[chan];
+    int brightness = channel->brightness & 0xff;
+    uint32_t *lut = device->symbol_lut[chan];
+
+    if ((device->lut_brightness[chan] != brightness) ||
+        (device->lut_invert[chan] != channel->invert))
+    {
+        int scale = brightness + 1;
+        int i, k;
+
+        for (i = 0; i < 256; i++)
+        {
+            uint8_t value = (i * scale) >> 8;
+            uint32_t symbols = 0;
+
+            for (k = 7; k >= 0; k--)
+            {
+                symbols = (symbols << 3) | ((value & (1 << k)) ? SYMBOL_HIGH : SYMBOL_LOW);
+            }
+
+            if (channel->invert)
+            {
+                symbols = ~symbols & 0xffffff;
+            }
+
+            lut[i] = symbols;
+        }
+
+        device->lut_brightness[chan] = brightness;
+        device->lut_invert[chan] = channel->invert;
+    }
+
+    return lut;
+}
+
 /**
  * Map a physical address and length into userspace virtual memory.
  *
@@ -315,7 +368,7 @@ static int setup_pwm(ws2811_t *ws2811)
     volatile dma_cb_t *dma_cb = device->dma_cb;
     volatile pwm_t *pwm = device->pwm;
     volatile cm_pwm_t *cm_pwm = device->cm_pwm;
-    int maxcount = max_channel_led_count(ws2811);
+    int maxcount = ws2811->device->max_count;
     uint32_t freq = ws2811->freq;
     dma_page_t *page;
     int32_t byte_count;
@@ -455,7 +508,7 @@ static int gpio_init(ws2811_t *ws2811)
 void pwm_raw_init(ws2811_t *ws2811)
 {
     volatile uint32_t *pwm_raw = (uint32_t *)ws2811->device->pwm_raw;
-    int maxcount = max_channel_led_count(ws2811);
+    int maxcount = ws2811->device->max_count;
     int wordcount = (PWM_BYTE_COUNT(maxcount, ws2811->freq) / sizeof(uint32_t)) /
                     RPI_PWM_CHANNELS;
     int chan;
@@ -506,11 +559,16 @@ void ws2811_cleanup(ws2811_t *ws2811)
         if (device->pwm_raw)
         {
             dma_page_free((uint8_t *)device->pwm_raw,
-                          PWM_BYTE_COUNT(max_channel_led_count(ws2811),
-                                         ws2811->freq));
+                          PWM_BYTE_COUNT(device->max_count, ws2811->freq));
             device->pwm_raw = NULL;
         }
 
+        if (device->pwm_render)
+        {
+            free(device->pwm_render);
+            device->pwm_render = NULL;
+        }
+
         if (device->dma_cb)
         {
             dma_page_free((dma_cb_t *)device->dma_cb, sizeof(dma_cb_t));
@@ -551,12 +609,18 @@ int ws2811_init(ws2811_t *ws2811)
 
     // Initialize all pointers to NULL.  Any non-NULL pointers will be freed on cleanup.
     device->pwm_raw = NULL;
+    device->pwm_render = NULL;
     device->dma_cb = NULL;
     for (chan = 0; chan < RPI_PWM_CHANNELS; chan++)
     {
         ws2811->channel[chan].leds = NULL;
+        device->lut_brightness[chan] = -1;     // Force a table build on first render
+        device->lut_invert[chan] = -1;
     }
 
+    // Buffers are sized for the largest channel once here and reused by every render.
+    device->max_count = max_channel_led_count(ws2811);
+
     dma_page_init(&device->page_head);
 
     // Allocate the LED buffers
@@ -575,8 +639,7 @@ int ws2811_init(ws2811_t *ws2811)
 
     // Allocate the DMA buffer
     device->pwm_raw = dma_alloc(&device->page_head,
-                                PWM_BYTE_COUNT(max_channel_led_count(ws2811),
-                                               ws2811->freq));
+                                PWM_BYTE_COUNT(device->max_count, ws2811->freq));
     if (!device->pwm_raw)
     {
         goto err;
@@ -584,9 +647,18 @@ int ws2811_init(ws2811_t *ws2811)
 
     pwm_raw_init(ws2811);
 
+    // Allocate the render buffer, so the next frame can be built while DMA is running
+    device->pwm_render = malloc(PWM_BYTE_COUNT(device->max_count, ws2811->freq));
+    if (!device->pwm_render)
+    {
+        goto err;
+    }
+    memcpy(device->pwm_render, (uint8_t *)device->pwm_raw,
+           PWM_BYTE_COUNT(device->max_count, ws2811->freq));
+
     // Allocate the DMA control block
-    device->dma_cb = dma_desc_alloc((PWM_BYTE_COUNT(max_channel_led_count(ws2811),
-                                    ws2811->freq) / PAGE_SIZE));
+    device->dma_cb = dma_desc_alloc((PWM_BYTE_COUNT(device->max_count, ws2811->freq) /
+                                    PAGE_SIZE));
     if (!device->dma_cb)
     {
         goto err;
@@ -671,86 +743,107 @@ int ws2811_wait(ws2811_t *ws2811)
     return 0;
 }
 
+/**
+ * Check whether a DMA operation is still executing.
+ *
+ * @param    ws2811  ws2811 instance pointer.
+ *
+ * @returns  1 if the DMA is still active, 0 otherwise
+ */
+int ws2811_busy(ws2811_t *ws2811)
+{
+    volatile dma_t *dma = ws2811->device->dma;
+
+    return (dma->cs & RPI_DMA_CS_ACTIVE) && !(dma->cs & RPI_DMA_CS_ERROR);
+}
+
 /**
  * Render the PWM DMA buffer from the user supplied LED arrays and start the DMA
- * controller.  This will update all LEDs on both PWM channels.
+ * controller.  This will update all LEDs on both PWM channels.  The bit pattern is
+ * built in a separate render buffer while any previous DMA operation is still running,
+ * and only copied to the DMA buffer once it completes.  Returns as soon as the new
+ * DMA operation is started, use ws2811_wait() to wait for it to complete.
  *
  * @param    ws2811  ws2811 instance pointer.
  *
- * @returns  None
+ * @returns  0 on success, -1 on DMA competion error
  */
 int ws2811_render(ws2811_t *ws2811)
 {
     volatile uint8_t *pwm_raw = ws2811->device->pwm_raw;
-    int maxcount = max_channel_led_count(ws2811);
-    int bitpos = 31;
-    int i, j, k, l, chan;
+    uint8_t *pwm_render = ws2811->device->pwm_render;
+    int maxcount = ws2811->device->max_count;
+    int i, j, chan;
 
     for (chan = 0; chan < RPI_PWM_CHANNELS; chan++)         // Channel
     {
         ws2811_channel_t *channel = &ws2811->channel[chan];
+        const uint32_t *lut = channel_symbol_lut(ws2811, chan);
+        uint32_t *words = (uint32_t *)pwm_render;
         int wordpos = chan;
-        int scale   = (channel->brightness & 0xff) + 1;
+        int bitpos = 31;
 
         for (i = 0; i < channel->count; i++)                // Led
         {
-            uint8_t color[] =
+            uint32_t symbols[] =
             {
-                (((channel->leds[i] >> 8)  & 0xff) * scale) >> 8, // green
-                (((channel->leds[i] >> 16) & 0xff) * scale) >> 8, // red
-                (((channel->leds[i] >> 0)  & 0xff) * scale) >> 8, // blue
+                lut[(channel->leds[i] >> 8)  & 0xff],      // green
+                lut[(channel->leds[i] >> 16) & 0xff],      // red
+                lut[(channel->leds[i] >> 0)  & 0xff],      // blue
             };
 
-            for (j = 0; j < ARRAY_SIZE(color); j++)        // Color
+            for (j = 0; j < ARRAY_SIZE(symbols); j++)      // Color
             {
-                for (k = 7; k >= 0; k--)                   // Bit
+                if (bitpos >= 23)
                 {
-                    uint8_t symbol = SYMBOL_LOW;
+                    // All 24 symbol bits fit in the current word
+                    int shift = bitpos - 23;
 
-                    if (color[j] & (1 << k))
-                    {
-                        symbol = SYMBOL_HIGH;
-                    }
+                    words[wordpos] = (words[wordpos] & ~(0xffffffUL << shift)) |
+                                     (symbols[j] << shift);
 
-                    if (channel->invert)
+                    bitpos -= 24;
+                    if (bitpos < 0)
                     {
-                        symbol = ~symbol & 0x7;
-                    }
+                        // Every other word is on the same channel
+                        wordpos += 2;
 
-                    for (l = 2; l >= 0; l--)               // Symbol
-                    {
-                        uint32_t *wordptr = &((uint32_t *)pwm_raw)[wordpos];
-
-                        *wordptr &= ~(1 << bitpos);
-                        if (symbol & (1 << l))
-                        {
-                            *wordptr |= (1 << bitpos);
-                        }
-
-                        bitpos--;
-                        if (bitpos < 0)
-                        {
-                            // Every other word is on the same channel
-                            wordpos += 2;
-
-                            bitpos = 31;
-                        }
+                        bitpos = 31;
                     }
                 }
+                else
+                {
+                    // Split the symbol bits across this word and the next one
+                    int high = bitpos + 1;
+                    int low = 24 - high;
+
+                    words[wordpos] = (words[wordpos] & ~((1UL << high) - 1)) |
+                                     (symbols[j] >> low);
+
+                    // Every other word is on the same channel
+                    wordpos += 2;
+
+                    words[wordpos] = (words[wordpos] & ~(0xffffffffUL << (32 - low))) |
+                                     (symbols[j] << (32 - low));
+
+                    bitpos = 31 - low;
+                }
             }
         }
     }
 
-    // Ensure the CPU data cache is flushed before the DMA is started.
-    __clear_cache((char *)pwm_raw,
-                  (char *)&pwm_raw[PWM_BYTE_COUNT(maxcount, ws2811->freq)]);
-
-    // Wait for any previous DMA operation to complete.
+    // Wait for any previous DMA operation to complete before replacing its data.
     if (ws2811_wait(ws2811))
     {
         return -1;
     }
 
+    memcpy((uint8_t *)pwm_raw, pwm_render, PWM_BYTE_COUNT(maxcount, ws2811->freq));
+
+    // Ensure the CPU data cache is flushed before the DMA is started.
+    __clear_cache((char *)pwm_raw,
+                  (char *)&pwm_raw[PWM_BYTE_COUNT(maxcount, ws2811->freq)]);
+
     dma_start(ws2811);
 
     return 0;
@@ -62,6 +62,7 @@ int ws2811_init(ws2811_t *ws2811);               //< Initialize buffers/hardware
 void ws2811_fini(ws2811_t *ws2811);              //< Tear it all down
 int ws2811_render(ws2811_t *ws2811);             //< Send LEDs off to hardware
 int ws2811_wait(ws2811_t *ws2811);               //< Wait for DMA completion
+int ws2811_busy(ws2811_t *ws2811);               //< Check for DMA in progress
 
 
 #endif /* __WS2811_H__ */